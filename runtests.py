@@ -15,15 +15,18 @@ def migrate():
     call_command('makemigrations', 'tests', verbosity=2, interactive=False)
 
 
-def runtests():
+def runtests(parallel=None):
     argv = [sys.argv[0], 'test', 'wagtail_modeltranslation']
+    if parallel:
+        argv += ['--parallel', parallel]
     execute_from_command_line(argv)
 
 
 if __name__ == '__main__':
     parser = OptionParser()
+    parser.add_option('--parallel', dest='parallel', help='run the test classes in PARALLEL processes')
     (options, args) = parser.parse_args()
     if 'migrate' in args:
         migrate()
     else:
-        runtests()
+        runtests(options.parallel)
@@ -10,6 +10,8 @@ LOGGING_CONFIG = None
 # Choose database for settings
 test_db = os.environ.get('DB', 'sqlite')
 test_db_host = os.getenv('DB_HOST', 'localhost')
+# Django runs a ':memory:' sqlite test database as a shared cache in-memory one
+# (file:memorydb_default?mode=memory&cache=shared), nothing ever hits the disk
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
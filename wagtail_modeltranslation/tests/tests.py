@@ -1,82 +1,112 @@
+import copy
+from contextlib import contextmanager
+from functools import partial, wraps
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.management import call_command
-from django.http import HttpRequest
-from django.test import TestCase, override_settings
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.utils import translation
+from wagtail.admin.edit_handlers import (FieldPanel, FieldRowPanel,
+                                         MultiFieldPanel, StreamFieldPanel)
+from wagtail.core.blocks import CharBlock
 from wagtail.core.models import Page, Site
-from wagtail.snippets.views.snippets import get_snippet_edit_handler
+from wagtail.images.edit_handlers import ImageChooserPanel
+from wagtail_modeltranslation.templatetags.wagtail_modeltranslation import \
+    slugurl_trans
 from wagtail_modeltranslation.tests import models
 
-from .util import page_factory
+from .util import get_page_form_class, get_snippet_form_class, page_factory
 
 request_factory = RequestFactory()
-
-
-class WagtailModeltranslationTest(TestCase):
-
-    @classmethod
-    def setUpClass(cls):
-        super(WagtailModeltranslationTest, cls).setUpClass()
-        Page.objects.all().delete()
+# tests only set the path or site of the requests they need, so shallow copies of this one will do
+_TEMPLATE_REQUEST = request_factory.get('/')
+
+_NAME_FIELDS = ('name_de', 'name_en')
+_BODY_FIELDS = ('body_de', 'body_en')
+# Fields of the inline models of InlinePanelPage and InlinePanelSnippet
+_INLINE_MODEL_FIELDS = ('field_name_de', 'field_name_en', 'image_chooser_de', 'image_chooser_en',
+                        'fieldrow_name_de', 'fieldrow_name_en', 'name_de', 'name_en', 'image_de', 'image_en',
+                        'other_name_de', 'other_name_en')
+
+# StreamFieldPanelPage's body fields are patched at startup and don't change afterwards
+_BODY_FIELD = models.StreamFieldPanelPage.body.field
+_BODY_DE_FIELD = models.StreamFieldPanelPage.body_de.field
+_BODY_EN_FIELD = models.StreamFieldPanelPage.body_en.field
+_BODY_EN_CHILD_BLOCKS = tuple(_BODY_EN_FIELD.stream_block.child_blocks.items())
+
+# Headroom allowed on top of the measured query counts given to assertMaxNumQueries, other
+# Wagtail/Django versions run a few more or less queries for the same test
+_QUERY_CEILING_MARGIN = 0.1
+
+# Builders for the nodes of page_factory.create_page_tree specs
+_root_page_node = partial(dict, model=models.TestRootPage)
+_slug_page1_node = partial(dict, model=models.TestSlugPage1)
+_slug_page2_node = partial(dict, model=models.TestSlugPage2)
+_routable_page_node = partial(dict, model=models.RoutablePageTest)
+
+
+class PanelPatchingTests(SimpleTestCase):
+    """
+    Introspection of the patched models, panels and forms, these don't need the database
+    """
+    # Translation fields are descriptors on the model class, no need for an instance
+    patchtestpage_fields = frozenset(dir(models.PatchTestPage))
+    patchtestsnippet_fields = frozenset(dir(models.PatchTestSnippet))
 
     def test_page_fields(self):
-        fields = dir(models.PatchTestPage())
-
         # Check if Page fields are being created
-        self.assertIn('title_en', fields)
-        self.assertIn('title_de', fields)
-        self.assertIn('slug_en', fields)
-        self.assertIn('slug_de', fields)
-        self.assertIn('seo_title_en', fields)
-        self.assertIn('seo_title_de', fields)
-        self.assertIn('search_description_en', fields)
-        self.assertIn('search_description_de', fields)
-        self.assertIn('url_path_en', fields)
-        self.assertIn('url_path_de', fields)
+        self.assertIn('title_en', self.patchtestpage_fields)
+        self.assertIn('title_de', self.patchtestpage_fields)
+        self.assertIn('slug_en', self.patchtestpage_fields)
+        self.assertIn('slug_de', self.patchtestpage_fields)
+        self.assertIn('seo_title_en', self.patchtestpage_fields)
+        self.assertIn('seo_title_de', self.patchtestpage_fields)
+        self.assertIn('search_description_en', self.patchtestpage_fields)
+        self.assertIn('search_description_de', self.patchtestpage_fields)
+        self.assertIn('url_path_en', self.patchtestpage_fields)
+        self.assertIn('url_path_de', self.patchtestpage_fields)
 
         # Check if subclass fields are being created
-        self.assertIn('description_en', fields)
-        self.assertIn('description_de', fields)
+        self.assertIn('description_en', self.patchtestpage_fields)
+        self.assertIn('description_de', self.patchtestpage_fields)
 
     def test_snippet_fields(self):
-        fields = dir(models.PatchTestSnippet())
-
-        self.assertIn('name', fields)
-        self.assertIn('name_en', fields)
-        self.assertIn('name_de', fields)
+        self.assertIn('name', self.patchtestsnippet_fields)
+        self.assertIn('name_en', self.patchtestsnippet_fields)
+        self.assertIn('name_de', self.patchtestsnippet_fields)
 
     def check_fieldpanel_patching(self, panels, name='name'):
         # Check if there is one panel per language
         self.assertEquals(len(panels), 2)
 
         # Validate if the created panels are instances of FieldPanel
-        from wagtail.admin.edit_handlers import FieldPanel
-
         self.assertIsInstance(panels[0], FieldPanel)
         self.assertIsInstance(panels[1], FieldPanel)
 
         # Check if both field names were correctly created
-        fields = [panel.field_name for panel in panels]
-        self.assertListEqual([name + '_de', name + '_en'], fields)
+        fields = tuple(panel.field_name for panel in panels)
+        self.assertEqual((name + '_de', name + '_en'), fields)
 
     def check_imagechooserpanel_patching(self, panels, name='image'):
         # Check if there is one panel per language
         self.assertEquals(len(panels), 2)
 
-        from wagtail.images.edit_handlers import ImageChooserPanel
         self.assertIsInstance(panels[0], ImageChooserPanel)
         self.assertIsInstance(panels[1], ImageChooserPanel)
 
         # Check if both field names were correctly created
-        fields = [panel.field_name for panel in panels]
-        self.assertListEqual([name + '_de', name + '_en'], fields)
+        fields = tuple(panel.field_name for panel in panels)
+        self.assertEqual((name + '_de', name + '_en'), fields)
 
     def check_fieldrowpanel_patching(self, panels, child_name='other_name'):
         # Check if the fieldrowpanel still exists
         self.assertEqual(len(panels), 1)
 
-        from wagtail.admin.edit_handlers import FieldRowPanel
         self.assertIsInstance(panels[0], FieldRowPanel)
 
         # Check if the children were correctly patched using the fieldpanel test
@@ -88,39 +118,34 @@ class WagtailModeltranslationTest(TestCase):
         # Check if there is one panel per language
         self.assertEquals(len(panels), 2)
 
-        from wagtail.admin.edit_handlers import StreamFieldPanel
         self.assertIsInstance(panels[0], StreamFieldPanel)
         self.assertIsInstance(panels[1], StreamFieldPanel)
 
         # Check if both field names were correctly created
-        fields = [panel.field_name for panel in panels]
-        self.assertListEqual(['body_de', 'body_en'], fields)
+        fields = tuple(panel.field_name for panel in panels)
+        self.assertEqual(_BODY_FIELDS, fields)
 
         # Fetch one of the streamfield panels to see if the block was correctly created
-        child_block = list(models.StreamFieldPanelPage.body_en.field.stream_block.child_blocks.items())
+        self.assertEquals(len(_BODY_EN_CHILD_BLOCKS), 1)
 
-        self.assertEquals(len(child_block), 1)
-
-        from wagtail.core.blocks import CharBlock
-        self.assertEquals(child_block[0][0], 'text')
-        self.assertIsInstance(child_block[0][1], CharBlock)
+        self.assertEquals(_BODY_EN_CHILD_BLOCKS[0][0], 'text')
+        self.assertIsInstance(_BODY_EN_CHILD_BLOCKS[0][1], CharBlock)
 
         # Original and Default language StreamFields are required
-        self.assertFalse(models.StreamFieldPanelPage.body.field.blank)
-        self.assertTrue(models.StreamFieldPanelPage.body.field.stream_block.required)
-        self.assertFalse(models.StreamFieldPanelPage.body_de.field.blank)
-        self.assertTrue(models.StreamFieldPanelPage.body_de.field.stream_block.required)
+        self.assertFalse(_BODY_FIELD.blank)
+        self.assertTrue(_BODY_FIELD.stream_block.required)
+        self.assertFalse(_BODY_DE_FIELD.blank)
+        self.assertTrue(_BODY_DE_FIELD.stream_block.required)
 
         # Translated StreamField is optional
-        self.assertTrue(models.StreamFieldPanelPage.body_en.field.blank)
-        self.assertFalse(models.StreamFieldPanelPage.body_en.field.stream_block.required)
+        self.assertTrue(_BODY_EN_FIELD.blank)
+        self.assertFalse(_BODY_EN_FIELD.stream_block.required)
 
     def check_multipanel_patching(self, panels):
         # There are three multifield panels, one for each of the available
         # children panels
         self.assertEquals(len(panels), 3)
 
-        from wagtail.admin.edit_handlers import MultiFieldPanel
         self.assertIsInstance(panels[0], MultiFieldPanel)
         self.assertIsInstance(panels[1], MultiFieldPanel)
         self.assertIsInstance(panels[2], MultiFieldPanel)
@@ -158,7 +183,7 @@ class WagtailModeltranslationTest(TestCase):
 
     def test_snippet_patching(self):
         self.check_fieldpanel_patching(panels=models.FieldPanelSnippet.panels)
-        self.check_panels_patching(models.FieldPanelSnippet, ['name_de', 'name_en'])
+        self.check_panels_patching(models.FieldPanelSnippet, _NAME_FIELDS)
 
         self.check_imagechooserpanel_patching(panels=models.ImageChooserPanelSnippet.panels)
         self.check_fieldrowpanel_patching(panels=models.FieldRowPanelSnippet.panels)
@@ -170,14 +195,12 @@ class WagtailModeltranslationTest(TestCase):
         self.check_inlinepanel_patching(panels=models.SnippetInlineModel.panels)
 
         # Case we don't define panels on snippet
-        self.check_panels_patching(models.PatchTestSnippetNoPanels, ['name_de', 'name_en'])
+        self.check_panels_patching(models.PatchTestSnippetNoPanels, _NAME_FIELDS)
 
     def check_panels_patching(self, model, model_fields):
-        patched_edit_handler = get_snippet_edit_handler(model)
-
-        form = patched_edit_handler.get_form_class()
+        form = get_snippet_form_class(model)
 
-        self.assertEqual(model_fields, list(form.base_fields.keys()))
+        self.assertEqual(model_fields, tuple(form.base_fields))
 
     def test_page_form(self):
         """
@@ -185,62 +208,114 @@ class WagtailModeltranslationTest(TestCase):
         so if the created form has all fields the the form was correctly patched
         """
 
-        page_edit_handler = models.InlinePanelPage.get_edit_handler()
-
-        form = page_edit_handler.get_form_class()
+        form = get_page_form_class(models.InlinePanelPage)
 
         page_base_fields = ['slug_de', 'slug_en', 'seo_title_de', 'seo_title_en', 'search_description_de',
                             'search_description_en', u'show_in_menus', u'go_live_at', u'expire_at']
 
-        form_fields = list(form.base_fields.keys())
         # exclude field injected in form:
         # https://github.com/wagtail/wagtail/blob/main/wagtail/admin/forms/pages.py#L131
-        if 'comment_notifications' in form_fields:
-            form_fields.remove('comment_notifications')
+        form_fields = [field for field in form.base_fields if field != 'comment_notifications']
         self.assertEqual(page_base_fields, form_fields)
 
-        inline_model_fields = ['field_name_de', 'field_name_en', 'image_chooser_de', 'image_chooser_en',
-                               'fieldrow_name_de', 'fieldrow_name_en', 'name_de', 'name_en', 'image_de', 'image_en',
-                               'other_name_de', 'other_name_en']
-
         related_formset_form = form.formsets['related_page_model'].form
-        self.assertEqual(inline_model_fields, list(related_formset_form.base_fields.keys()))
+        self.assertEqual(_INLINE_MODEL_FIELDS, tuple(related_formset_form.base_fields))
 
     def test_snippet_form(self):
         """
         In this test we use the InlinePanelSnippet model because it has all the possible "patchable" fields
         so if the created form has all fields the the form was correctly patched
         """
-        snippet_edit_handler = get_snippet_edit_handler(models.InlinePanelSnippet)
+        form = get_snippet_form_class(models.InlinePanelSnippet)
 
-        form = snippet_edit_handler.get_form_class()
+        related_formset_form = form.formsets['related_snippet_model'].form
 
-        inline_model_fields = ['field_name_de', 'field_name_en', 'image_chooser_de', 'image_chooser_en',
-                               'fieldrow_name_de', 'fieldrow_name_en', 'name_de', 'name_en', 'image_de', 'image_en',
-                               'other_name_de', 'other_name_en']
+        self.assertEqual(_INLINE_MODEL_FIELDS, tuple(related_formset_form.base_fields))
 
-        related_formset_form = form.formsets['related_snippet_model'].form
+    def test_searchfield_patching(self):
+        # Check if the search fields have the original field plus the translated ones
+        expected_fields = ['title', 'title_de', 'title_en', 'description', 'description_de', 'description_en']
 
-        self.assertEqual(inline_model_fields, list(related_formset_form.base_fields.keys()))
+        model_search_fields = [searchfield.field_name for searchfield in models.PatchTestPage.search_fields]
+
+        self.assertCountEqual(expected_fields, model_search_fields)
 
-    def test_duplicate_slug(self):
-        from wagtail.core.models import Site
 
-        # Create a test Site with a root page
-        root = models.TestRootPage(title='title', depth=1, path='0001', slug_en='slug_en', slug_de='slug_de')
-        root.save()
+def max_num_queries(num):
+    """
+    Fails the decorated PageTreeTestCase test when it executes clearly more than ``num`` queries.
+    ``num`` is the count measured with Wagtail 2.16 / Django 4.0 on sqlite, assertMaxNumQueries
+    adds _QUERY_CEILING_MARGIN on top of it, the ceilings only guard against regressions.
+    """
+    def decorator(test_method):
+        @wraps(test_method)
+        def wrapper(self, *args, **kwargs):
+            with self.assertMaxNumQueries(num):
+                return test_method(self, *args, **kwargs)
+        return wrapper
+    return decorator
 
-        site = Site(root_page=root)
-        site.save()
 
+@override_settings(LANGUAGE_CODE='de')
+class PageTreeTestCase(TestCase):
+    """
+    Base class for tests working with page trees, they all run with German as the default language
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Wipe the pages (and the site) created by Wagtail's migrations, tests build their own
+        # root pages and they would clash with Wagtail's ones. Doing it here keeps the wipe inside
+        # the class transaction, so it is rolled back with everything else.
+        Page.objects.all().delete()
+        # Fill the content type cache for the page models the tests build, so query counts
+        # don't depend on which test happened to look them up first
+        ContentType.objects.get_for_models(
+            Page, models.TestRootPage, models.TestSlugPage1, models.TestSlugPage2,
+            models.StreamFieldPanelPage, models.RoutablePageTest)
+        # Shared root page and site, created once per class. Tests adding children to it rely on
+        # TestCase rolling back their changes.
+        cls.root = models.TestRootPage.objects.create(
+            title='shared root', depth=1, path=page_factory.get_root_path(),
+            slug_en='shared-root-en', slug_de='shared-root-de')
+        cls.site = Site.objects.create(root_page=cls.root, hostname='localhost', port=80, is_default_site=True)
+
+    def setUp(self):
+        super(PageTreeTestCase, self).setUp()
+        # The shared site survives between tests but the pages it was pointed at may not,
+        # so don't let a previous test's site root paths leak through the cache
+        cache.clear()
+
+    @contextmanager
+    def assertMaxNumQueries(self, num):
+        """
+        Like assertNumQueries but only fails when more than ``num`` queries, plus
+        _QUERY_CEILING_MARGIN of headroom, are executed
+        """
+        ceiling = int(num * (1 + _QUERY_CEILING_MARGIN))
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        executed = len(context)
+        self.assertLessEqual(
+            executed, ceiling,
+            '%d queries executed, at most %d expected\nCaptured queries were:\n%s' % (
+                executed, ceiling, '\n'.join(query['sql'] for query in context.captured_queries)))
+
+
+class WagtailModeltranslationTest(PageTreeTestCase):
+    """
+    Saving, moving and fetching translated pages
+    """
+
+    @max_num_queries(43)
+    def test_duplicate_slug(self):
         # Add children to the root
-        root.add_child(
-            instance=models.TestSlugPage1(title='child1', slug_de='child', slug_en='child-en', depth=2, path='00010001')
+        self.root.add_child(
+            instance=models.TestSlugPage1(title='child1', slug_de='child', slug_en='child-en')
         )
 
-        child2 = root.add_child(
-            instance=models.TestSlugPage2(title='child2', slug_de='child-2', slug_en='child2-en', depth=2,
-                                          path='00010002')
+        child2 = self.root.add_child(
+            instance=models.TestSlugPage2(title='child2', slug_de='child-2', slug_en='child2-en')
         )
 
         # Clean should work fine as the two slugs are different
@@ -255,142 +330,34 @@ class WagtailModeltranslationTest(TestCase):
         child2.slug_en = 'child-en'
         self.assertRaises(ValidationError, child2.clean)
 
-    @override_settings(LANGUAGE_CODE='de')
-    def test_slugurl_trans(self):
-        """
-        Assert tag slugurl_trans is immune to user's current language
-        """
-        from wagtail_modeltranslation.templatetags.wagtail_modeltranslation import \
-            slugurl_trans
-        site_pages = {
-            'model': models.TestRootPage,
-            'kwargs': {'title_de': 'root slugurl', },
-            'children': {
-                'child': {
-                    'model': models.TestSlugPage1,
-                    'kwargs': {'title': 'child slugurl', 'slug': 'child-slugurl', 'slug_en': 'child-slugurl-en'},
-                    'children': {},
-                },
-            },
-        }
-        site = page_factory.create_page_tree(site_pages)
-
-        request_mock = request_factory.get('/')
-        setattr(request_mock, 'site', site)
-        context = {'request': request_mock}
-
-        self.assertEqual(slugurl_trans(context, 'root-slugurl'), '/de/')
-        self.assertEqual(slugurl_trans(context, 'child-slugurl'), '/de/child-slugurl/')
-        self.assertEqual(slugurl_trans(context, 'child-slugurl-en', 'en'), '/de/child-slugurl/')
-
-        translation.activate('en')
-
-        self.assertEqual(slugurl_trans(context, 'root-slugurl'), '/en/')
-        self.assertEqual(slugurl_trans(context, 'child-slugurl'), '/en/child-slugurl-en/')
-        self.assertEqual(slugurl_trans(context, 'child-slugurl-en', 'en'), '/en/child-slugurl-en/')
-
-    @override_settings(LANGUAGE_CODE='de')
-    def test_relative_url(self):
-        # Create a test Site with a root page
-        root = models.TestRootPage(title_de='title slugurl', depth=1, path='0004',
-                                   slug_en='title_slugurl_en', slug_de='title_slugurl_de')
-        root.save()
-        site = Site(root_page=root)
-        site.save()
-
-        # Add children to the root
-        child = root.add_child(
-            instance=models.TestSlugPage1(
-                title_de='child1 slugurl',
-                slug_de='child-slugurl-de',
-                slug_en='child-slugurl-en',
-                depth=2, path='00040001'
-            )
-        )
-        child.save_revision().publish()
-
-        url_1_de = child.relative_url(site)
-        self.assertEqual(
-            url_1_de,
-            '/de/child-slugurl-de/',
-            'When using the default language, slugurl produces the wrong url.'
-        )
-
-        translation.activate('en')
-
-        url_1_en = child.relative_url(site)
-        self.assertEqual(url_1_en, '/en/child-slugurl-en/',
-                         'When using non-default language, slugurl produces the wrong url.')
-
-        # Add children using non-default language
-        child2 = root.add_child(
-            instance=models.TestSlugPage2(
-                title='child2 slugurl',
-                title_de='child2 slugurl DE',
-                slug_de='child2-slugurl-de',
-                slug_en='child2-slugurl-en',
-                depth=2,
-                path='00040002'
-            )
-        )
-        child2.save_revision().publish()
-
-        url_2_en = child2.relative_url(site)
-        self.assertEqual(url_2_en, '/en/child2-slugurl-en/',
-                         'When using non-default language, slugurl produces the wrong url.')
-
-        translation.activate('de')
-
-        url_2_de = child2.relative_url(site)
-        self.assertEqual(url_2_de, '/de/child2-slugurl-de/',
-                         'When using non-default language, slugurl produces the wrong url.')
-
-    def test_searchfield_patching(self):
-        # Check if the search fields have the original field plus the translated ones
-        expected_fields = ['title', 'title_de', 'title_en', 'description', 'description_de', 'description_en']
-
-        model_search_fields = [searchfield.field_name for searchfield in models.PatchTestPage.search_fields]
-
-        self.assertCountEqual(expected_fields, model_search_fields)
-
+    @max_num_queries(16)
     def test_streamfield_fallback(self):
         body_text = '[{"value": "Some text", "type": "text"}]'
-        page = models.StreamFieldPanelPage(title='Streamfield Fallback', slug='streamfield_fallback',
-                                           depth=1, path='0005', body=body_text)
-        page.save()
+        page = models.StreamFieldPanelPage.objects.create(
+            title='Streamfield Fallback', slug='streamfield_fallback',
+            depth=1, path=page_factory.get_root_path(), body=body_text)
 
         self.assertEqual(str(page.body), '<div class="block-text">Some text</div>')
 
-        translation.activate('en')
-
-        self.assertEqual(str(page.body), '<div class="block-text">Some text</div>',
-                         'page.body did not fallback to original language.')
+        with translation.override('en'):
+            self.assertEqual(str(page.body), '<div class="block-text">Some text</div>',
+                             'page.body did not fallback to original language.')
 
-    @override_settings(LANGUAGE_CODE='de')
+    @max_num_queries(194)
     def test_set_url_path(self):
         """
         Assert translation URL Paths are correctly set in page and descendants for a slug change and
         page move operations
         """
-        from wagtail.core.models import Site
-
-        # Create a test Site with a root page
-        root = models.TestRootPage.objects.create(title='url paths', depth=1, path='0006', slug='url-path-slug')
-
-        Site.objects.create(root_page=root)
-
         # Add children to the root
-        child = root.add_child(
+        child = self.root.add_child(
             instance=models.TestSlugPage1(
                 title_de='child',
                 title_en='child',
                 slug_de='child',
-                slug_en='child',
-                depth=2,
-                path='00060001'
+                slug_en='child'
             )
         )
-        child.save()
 
         # Add grandchildren to the root
         grandchild = child.add_child(
@@ -398,15 +365,12 @@ class WagtailModeltranslationTest(TestCase):
                 title_de='grandchild',
                 title_en='grandchild',
                 slug_de='grandchild',
-                slug_en='grandchild',
-                depth=2,
-                path='000600010001')
+                slug_en='grandchild')
         )
-        grandchild.save()
 
         # check everything is as expected
-        self.assertEqual(root.url_path_de, '/')
-        self.assertEqual(root.url_path_en, '/')
+        self.assertEqual(self.root.url_path_de, '/')
+        self.assertEqual(self.root.url_path_en, '/')
         self.assertEqual(child.url_path_de, '/child/')
         self.assertEqual(child.url_path_en, '/child/')
         self.assertEqual(grandchild.url_path_de, '/child/grandchild/')
@@ -432,23 +396,20 @@ class WagtailModeltranslationTest(TestCase):
         self.assertEqual(child.url_path_de, '/child/')
         self.assertEqual(child.url_path_en, '/child_en/')
 
-        # Retrieve grandchild from DB:
-        grandchild_new = models.TestSlugPage1.objects.get(id=grandchild.id)
-        self.assertEqual(grandchild_new.url_path_en, '/child_en/grandchild_en/')
-        self.assertEqual(grandchild_new.url_path_de, '/child/grandchild_de/')
+        # Reload grandchild url paths from DB:
+        grandchild.refresh_from_db(fields=['url_path_de', 'url_path_en'])
+        self.assertEqual(grandchild.url_path_en, '/child_en/grandchild_en/')
+        self.assertEqual(grandchild.url_path_de, '/child/grandchild_de/')
 
         # Add 2nd child to the root
-        child2 = root.add_child(
+        child2 = self.root.add_child(
             instance=models.TestSlugPage1(
                 title_de='child2',
                 title_en='child2',
                 slug_de='child2',
-                slug_en='child2',
-                depth=2,
-                path='00060002'
+                slug_en='child2'
             )
         )
-        child2.save()
 
         self.assertEqual(child2.url_path_de, '/child2/')
         self.assertEqual(child2.url_path_en, '/child2/')
@@ -459,12 +420,9 @@ class WagtailModeltranslationTest(TestCase):
                 title_de='grandchild2',
                 title_en='grandchild2',
                 slug_de='grandchild2',
-                slug_en='grandchild2',
-                depth=3,
-                path='000600020001'
+                slug_en='grandchild2'
             )
         )
-        grandchild2.save()
 
         self.assertEqual(grandchild2.url_path_de, '/child2/grandchild2/')
         self.assertEqual(grandchild2.url_path_en, '/child2/grandchild2/')
@@ -472,11 +430,12 @@ class WagtailModeltranslationTest(TestCase):
         # PAGE MOVE
         child2.move(child, pos='last-child')
 
-        # re-fetch child2 to confirm db fields have been updated
-        child2 = models.TestSlugPage1.objects.get(id=child2.id)
+        # reload child2 to confirm db fields have been updated
+        child2.refresh_from_db(fields=['depth', 'path', 'url_path_de', 'url_path_en'])
 
         self.assertEqual(child2.depth, 3)
-        self.assertEqual(child2.get_parent().id, child.id)
+        # the parent cached on the instance before the move is stale
+        self.assertEqual(child2.get_parent(update=True).id, child.id)
         self.assertEqual(child2.url_path_de, '/child/child2/')
         self.assertEqual(child2.url_path_en, '/child_en/child2/')
 
@@ -486,44 +445,64 @@ class WagtailModeltranslationTest(TestCase):
         self.assertEqual(grandchild2.url_path_de, '/child/child2/grandchild2/')
         self.assertEqual(grandchild2.url_path_en, '/child_en/child2/grandchild2/')
 
-    def test_set_url_path_non_translated_descendants(self):
+    @max_num_queries(17)
+    def test_fetch_translation_records(self):
         """
-        Assert set_url_path works correctly when a Page with untranslated children
-        has its translated slug changed.
+        Assert that saved translation fields are retrieved correctly
+        See: https://github.com/infoportugal/wagtail-modeltranslation/issues/103#issuecomment-352006610
         """
-        site_pages = {
-            'model': models.TestRootPage,
-            'kwargs': {'title': 'root untranslated', },
-            'children': {
-                'child': {
-                    'model': models.TestSlugPage1,
-                    'kwargs': {'title': 'child untranslated'},
-                    'children': {
-                        'grandchild1': {
-                            'model': models.TestSlugPage1,
-                            'kwargs': {'title': 'grandchild1 untranslated'},
-                            'children': {
-                                'grandgrandchild': {
-                                    'model': models.TestSlugPage1,
-                                    'kwargs': {'title': 'grandgrandchild untranslated'},
-                                },
-                            },
-                        },
-                        'grandchild2': {
-                            'model': models.TestSlugPage2,
-                            'kwargs': {'title': 'grandchild2 untranslated'},
-                        },
-                    },
-                },
-            },
-        }
-        page_factory.create_page_tree(site_pages)
+        page = models.StreamFieldPanelPage.objects.create(
+            title_de='Fetch DE', title_en='Fetch EN', slug_de='fetch_de', slug_en='fetch_en',
+            body_de=[('text', 'fetch de')], body_en=[('text', 'fetch en')], depth=1, path=page_factory.get_root_path())
+
+        page_db = models.StreamFieldPanelPage.objects.get(id=page.id)
+
+        self.assertEqual(page_db.title_de, 'Fetch DE')
+        self.assertEqual(page_db.slug_de, 'fetch_de')
+        self.assertEqual(str(page_db.body_de), '<div class="block-text">fetch de</div>')
+        self.assertEqual(page_db.title_en, 'Fetch EN')
+        self.assertEqual(page_db.slug_en, 'fetch_en')
+        self.assertEqual(str(page_db.body_en), '<div class="block-text">fetch en</div>')
+
+
+class UntranslatedPagesTests(PageTreeTestCase):
+    """
+    Pages which haven't been translated yet, they all share the same page tree
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super(UntranslatedPagesTests, cls).setUpTestData()
+        _, cls.pages = page_factory.create_page_tree_flat([
+            ('', models.TestRootPage, {'title': 'root untranslated'}),
+            ('child', models.TestSlugPage1, {'title': 'child untranslated'}),
+            ('child.grandchild1', models.TestSlugPage1, {'title': 'grandchild1 untranslated'}),
+            ('child.grandchild1.grandgrandchild', models.TestSlugPage1, {'title': 'grandgrandchild untranslated'}),
+            ('child.grandchild2', models.TestSlugPage2, {'title': 'grandchild2 untranslated'}),
+            ('child2', models.TestSlugPage1, {'title': 'child2 translated', 'slug_en': 'child2-translated-en'}),
+            ('child2.grandchild1', models.TestSlugPage1,
+             {'title': 'grandchild1 translated', 'slug_en': 'grandchild1-translated-en'}),
+            ('child2.grandchild1.grandgrandchild', models.TestSlugPage1,
+             {'title': 'grandgrandchild1 translated', 'slug_en': 'grandgrandchild1-translated-en'}),
+        ])
 
         # Revert grandchild1 and grandgrandchild url_path_en to their initial untranslated states
         # to simulate pages that haven't been translated yet
-        models.TestSlugPage1.objects.filter(slug_de__in=['grandchild1-untranslated', 'grandgrandchild-untranslated'])\
+        models.TestSlugPage1.objects.filter(slug_de__in=['grandchild1-untranslated', 'grandgrandchild-untranslated']) \
             .rewrite(False).update(slug_en=None, url_path_en=None)
 
+    def get_slug_pages(self, *slugs):
+        """
+        Fetch the TestSlugPage1 pages with the given German slugs in one query, keyed by slug
+        """
+        return {page.slug_de: page for page in models.TestSlugPage1.objects.filter(slug_de__in=slugs)}
+
+    @max_num_queries(64)
+    def test_set_url_path_non_translated_descendants(self):
+        """
+        Assert set_url_path works correctly when a Page with untranslated children
+        has its translated slug changed.
+        """
         # re-fetch to pick up latest from DB
         grandchild1 = models.TestSlugPage1.objects.get(slug_de='grandchild1-untranslated')
         self.assertEqual(grandchild1.url_path_de, '/root-untranslated/child-untranslated/grandchild1-untranslated/')
@@ -535,375 +514,386 @@ class WagtailModeltranslationTest(TestCase):
         self.assertEqual(grandgrandchild.slug_en, None)
         self.assertEqual(grandgrandchild.url_path_en, None)
 
-        translation.activate('en')
+        with translation.override('en'):
+            child = self.pages['child']
+            child.slug_en = 'child-translated'
+            child.save()
 
-        child = site_pages['children']['child']['instance']
-        child.slug_en = 'child-translated'
-        child.save()
+            self.assertEqual(child.url_path_de, '/root-untranslated/child-untranslated/')
+            self.assertEqual(child.url_path_en, '/root-untranslated/child-translated/')
 
-        self.assertEqual(child.url_path_de, '/root-untranslated/child-untranslated/')
-        self.assertEqual(child.url_path_en, '/root-untranslated/child-translated/')
+            grandchild1 = models.TestSlugPage1.objects.get(slug_de='grandchild1-untranslated')
+            self.assertEqual(grandchild1.url_path_de, '/root-untranslated/child-untranslated/grandchild1-untranslated/')
+            self.assertEqual(grandchild1.url_path_en, '/root-untranslated/child-translated/grandchild1-untranslated/')
 
-        grandchild1 = models.TestSlugPage1.objects.get(slug_de='grandchild1-untranslated')
-        self.assertEqual(grandchild1.url_path_de, '/root-untranslated/child-untranslated/grandchild1-untranslated/')
-        self.assertEqual(grandchild1.url_path_en, '/root-untranslated/child-translated/grandchild1-untranslated/')
+            grandgrandchild = models.TestSlugPage1.objects.get(slug_de='grandgrandchild-untranslated')
+            self.assertEqual(grandgrandchild.url_path_de,
+                             '/root-untranslated/child-untranslated/grandchild1-untranslated/grandgrandchild-untranslated/')
+            self.assertEqual(grandgrandchild.url_path_en,
+                             '/root-untranslated/child-translated/grandchild1-untranslated/grandgrandchild-untranslated/')
 
-        grandgrandchild = models.TestSlugPage1.objects.get(slug_de='grandgrandchild-untranslated')
-        self.assertEqual(grandgrandchild.url_path_de,
-                         '/root-untranslated/child-untranslated/grandchild1-untranslated/grandgrandchild-untranslated/')
-        self.assertEqual(grandgrandchild.url_path_en,
-                         '/root-untranslated/child-translated/grandchild1-untranslated/grandgrandchild-untranslated/')
+    @max_num_queries(188)
+    def test_set_translation_url_paths_command(self):
+        """
+        Assert set_translation_url_paths management command works correctly
+        """
+        # re-fetch to pick up latest from DB
+        pages = self.get_slug_pages('grandchild1-untranslated', 'grandgrandchild-untranslated')
+        self.assertEqual(pages['grandchild1-untranslated'].url_path_en, None)
+        self.assertEqual(pages['grandgrandchild-untranslated'].url_path_en, None)
 
-    def test_fetch_translation_records(self):
+        # change grandchild2 url_path to corrupt it in order to simulate Wagtail's 0.7 corruption bug:
+        # http://docs.wagtail.io/en/latest/releases/0.8.html#corrupted-url-paths-may-need-fixing
+        models.TestSlugPage2.objects.filter(
+            slug_de__in=['grandchild2-untranslated']
+        ).rewrite(False).update(url_path='corrupted', url_path_de='corrupted')
+
+        grandchild2 = models.TestSlugPage2.objects.get(slug_de='grandchild2-untranslated')
+        self.assertEqual(grandchild2.__dict__['url_path'], 'corrupted')
+
+        # the command walks the whole tree saving each page, this only guards against it getting worse
+        with self.assertMaxNumQueries(182):
+            call_command('set_translation_url_paths', verbosity=0)
+
+        pages = self.get_slug_pages(
+            'grandchild1-untranslated', 'grandgrandchild-untranslated', 'grandgrandchild1-translated'
+        )
+        grandchild2 = models.TestSlugPage2.objects.get(slug_de='grandchild2-untranslated')
+        pages[grandchild2.slug_de] = grandchild2
+        self.assertEqual(
+            grandchild2.__dict__['url_path'],
+            '/root-untranslated/child-untranslated/grandchild2-untranslated/'
+        )
+
+        expected = [
+            ('grandchild1-untranslated', 'url_path_de',
+             '/root-untranslated/child-untranslated/grandchild1-untranslated/'),
+            ('grandchild1-untranslated', 'url_path_en',
+             '/root-untranslated/child-untranslated/grandchild1-untranslated/'),
+            ('grandgrandchild-untranslated', 'url_path_de',
+             '/root-untranslated/child-untranslated/grandchild1-untranslated/grandgrandchild-untranslated/'),
+            ('grandgrandchild-untranslated', 'url_path_en',
+             '/root-untranslated/child-untranslated/grandchild1-untranslated/grandgrandchild-untranslated/'),
+            ('grandchild2-untranslated', 'url_path_de',
+             '/root-untranslated/child-untranslated/grandchild2-untranslated/'),
+            ('grandchild2-untranslated', 'url_path_en',
+             '/root-untranslated/child-untranslated/grandchild2-untranslated/'),
+            ('grandgrandchild1-translated', 'url_path_de',
+             '/root-untranslated/child2-translated/grandchild1-translated/grandgrandchild1-translated/'),
+            ('grandgrandchild1-translated', 'url_path_en',
+             '/root-untranslated/child2-translated-en/grandchild1-translated-en/grandgrandchild1-translated-en/'),
+        ]
+        for slug, field, url_path in expected:
+            with self.subTest(page=slug, field=field):
+                self.assertEqual(getattr(pages[slug], field), url_path)
+
+
+class PageRoutingTests(PageTreeTestCase):
+    """
+    Page URLs and request routing for translated slugs
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super(PageRoutingTests, cls).setUpTestData()
+        # request for the shared site, copied for every test along with the rest of the class data.
+        # Setting _wagtail_site spares Site.find_for_request looking it up again.
+        cls.request = request_factory.get('/', HTTP_HOST=cls.site.hostname, SERVER_PORT=cls.site.port)
+        cls.request._wagtail_site = cls.site
+
+    @max_num_queries(70)
+    def test_slugurl_trans(self):
         """
-        Assert that saved translation fields are retrieved correctly
-        See: https://github.com/infoportugal/wagtail-modeltranslation/issues/103#issuecomment-352006610
+        Assert tag slugurl_trans is immune to user's current language
         """
-        page = models.StreamFieldPanelPage.objects.create(
-            title_de='Fetch DE', title_en='Fetch EN', slug_de='fetch_de', slug_en='fetch_en',
-            body_de=[('text', 'fetch de')], body_en=[('text', 'fetch en')], depth=1, path='0007')
-        page.save()
+        site_pages = _root_page_node(
+            kwargs={'title_de': 'root slugurl', },
+            children={
+                'child': _slug_page1_node(
+                    kwargs={'title': 'child slugurl', 'slug': 'child-slugurl', 'slug_en': 'child-slugurl-en'},
+                    children={},
+                ),
+            },
+        )
+        site = page_factory.create_page_tree(site_pages)
 
-        page_db = models.StreamFieldPanelPage.objects.get(id=page.id)
+        request_mock = copy.copy(_TEMPLATE_REQUEST)
+        setattr(request_mock, 'site', site)
+        context = {'request': request_mock}
 
-        self.assertEqual(page_db.title_de, 'Fetch DE')
-        self.assertEqual(page_db.slug_de, 'fetch_de')
-        self.assertEqual(str(page_db.body_de), '<div class="block-text">fetch de</div>')
-        self.assertEqual(page_db.title_en, 'Fetch EN')
-        self.assertEqual(page_db.slug_en, 'fetch_en')
-        self.assertEqual(str(page_db.body_en), '<div class="block-text">fetch en</div>')
+        self.assertEqual(slugurl_trans(context, 'root-slugurl'), '/de/')
+        self.assertEqual(slugurl_trans(context, 'child-slugurl'), '/de/child-slugurl/')
+        self.assertEqual(slugurl_trans(context, 'child-slugurl-en', 'en'), '/de/child-slugurl/')
 
-    def check_route_request(self, root_page, components, expected_page):
-        # site = Site.objects.get(is_default_site=True)
-        request = HttpRequest()
-        # request.META['HTTP_HOST'] = site.hostname
-        # request.META['SERVER_PORT'] = site.port
+        with translation.override('en'):
+            self.assertEqual(slugurl_trans(context, 'root-slugurl'), '/en/')
+            self.assertEqual(slugurl_trans(context, 'child-slugurl'), '/en/child-slugurl-en/')
+            self.assertEqual(slugurl_trans(context, 'child-slugurl-en', 'en'), '/en/child-slugurl-en/')
+
+    @max_num_queries(43)
+    def test_relative_url(self):
+        # Add children to the root
+        child = self.root.add_child(
+            instance=models.TestSlugPage1(
+                title_de='child1 slugurl',
+                slug_de='child-slugurl-de',
+                slug_en='child-slugurl-en',
+                live=True,
+            )
+        )
+
+        url_1_de = child.relative_url(self.site)
+        self.assertEqual(
+            url_1_de,
+            '/de/child-slugurl-de/',
+            'When using the default language, slugurl produces the wrong url.'
+        )
+
+        with translation.override('en'):
+            url_1_en = child.relative_url(self.site)
+            self.assertEqual(url_1_en, '/en/child-slugurl-en/',
+                             'When using non-default language, slugurl produces the wrong url.')
+
+            # Add children using non-default language
+            child2 = self.root.add_child(
+                instance=models.TestSlugPage2(
+                    title='child2 slugurl',
+                    title_de='child2 slugurl DE',
+                    slug_de='child2-slugurl-de',
+                    slug_en='child2-slugurl-en',
+                    live=True,
+                )
+            )
+
+            url_2_en = child2.relative_url(self.site)
+            self.assertEqual(url_2_en, '/en/child2-slugurl-en/',
+                             'When using non-default language, slugurl produces the wrong url.')
+
+        with translation.override('de'):
+            url_2_de = child2.relative_url(self.site)
+            self.assertEqual(url_2_de, '/de/child2-slugurl-de/',
+                             'When using non-default language, slugurl produces the wrong url.')
 
+    def check_route_request(self, root_page, components, expected_page):
+        request = copy.copy(_TEMPLATE_REQUEST)
         request.path = '/' + '/'.join(components) + '/'
         (found_page, args, kwargs) = root_page.route(request, components)
         self.assertEqual(found_page, expected_page)
 
-    @override_settings(LANGUAGE_CODE='de')
+    @max_num_queries(179)
     def test_request_routing(self):
         """
         Assert .route works for translated slugs
         """
-        site_pages = {
-            'model': models.TestRootPage,
-            'kwargs': {
+        site_pages = _root_page_node(
+            kwargs={
                 'title_de': 'root routing',
                 'slug_de': 'root-routing'
             },
-            'children': {
-                'child1': {
-                    'model': models.TestSlugPage1,
-                    'kwargs': {
+            children={
+                'child1': _slug_page1_node(
+                    kwargs={
                         'title_de': 'child1 routing',
                         'slug_de': 'routing-de-01',
                         'slug_en': 'routing-en-01'
                     },
-                    'children': {
-                        'grandchild1': {
-                            'model': models.TestSlugPage1,
-                            'kwargs': {
+                    children={
+                        'grandchild1': _slug_page1_node(
+                            kwargs={
                                 'title_de': 'grandchild1 routing',
                                 'slug_de': 'routing-de-0101',
                                 'slug_en': 'routing-en-0101'
                             },
-                        },
+                        ),
                     },
-                },
-                'child2': {
-                    'model': models.TestSlugPage1,
-                    'kwargs': {
+                ),
+                'child2': _slug_page1_node(
+                    kwargs={
                         'title_de': 'child2 routing',
                         'slug_de': 'routing-de-02'
                     },
-                    'children': {
-                        'grandchild1': {
-                            'model': models.TestSlugPage1,
-                            'kwargs': {
+                    children={
+                        'grandchild1': _slug_page1_node(
+                            kwargs={
                                 'title_de': 'grandchild1 routing',
                                 'slug_de': 'routing-de-0201'
                             },
-                        },
+                        ),
                     },
-                },
-                'routable_page': {
-                    'model': models.RoutablePageTest,
-                    'kwargs': {
+                ),
+                'routable_page': _routable_page_node(
+                    kwargs={
                         'title_de': 'Routable Page',
                         'slug_de': 'routing-de-03',
                         'slug_en': 'routing-en-03',
                         'live': True
                     },
-                    'children': {
-                        'grandchild1': {
-                            'model': models.TestSlugPage1,
-                            'kwargs': {
+                    children={
+                        'grandchild1': _slug_page1_node(
+                            kwargs={
                                 'title_de': 'grandchild1 routing',
                                 'slug_de': 'routing-de-0301',
                                 'slug_en': 'routing-en-0301'
                             },
-                        },
+                        ),
                     },
-                },
+                ),
             },
-        }
+        )
         page_factory.create_page_tree(site_pages)
 
         root_page = site_pages['instance']
-        page_0101 = site_pages['children']['child1']['children']['grandchild1']['instance']
-        page_0201 = site_pages['children']['child2']['children']['grandchild1']['instance']
-        page_0301 = site_pages['children']['routable_page']['children']['grandchild1']['instance']
+        page_0101 = site_pages['flat']['child1.grandchild1']
+        page_0201 = site_pages['flat']['child2.grandchild1']
+        page_0301 = site_pages['flat']['routable_page.grandchild1']
 
         self.check_route_request(root_page, ['routing-de-01', 'routing-de-0101'], page_0101)
         self.check_route_request(root_page, ['routing-de-02', 'routing-de-0201'], page_0201)
 
         # routable page test
-        routable_page = site_pages['children']['routable_page']['instance']
+        routable_page = site_pages['flat']['routable_page']
         view, args, kwargs = routable_page.resolve_subpage('/archive/year/2014/')
         self.assertEqual(view, routable_page.archive_by_year)
         self.assertEqual(args, ('2014',))
         self.assertEqual(kwargs, {})
         self.check_route_request(root_page, ['routing-de-03', 'routing-de-0301'], page_0301)
 
-        translation.activate('en')
+        with translation.override('en'):
+            # assert translated slugs fetch the correct page
+            self.check_route_request(root_page, ['routing-en-01', 'routing-en-0101'], page_0101)
+            # in the absence of translated slugs assert the default ones work
+            self.check_route_request(root_page, ['routing-de-02', 'routing-de-0201'], page_0201)
 
-        # assert translated slugs fetch the correct page
-        self.check_route_request(root_page, ['routing-en-01', 'routing-en-0101'], page_0101)
-        # in the absence of translated slugs assert the default ones work
-        self.check_route_request(root_page, ['routing-de-02', 'routing-de-0201'], page_0201)
-
-        view, args, kwargs = routable_page.resolve_subpage('/archive/year/2014/')
-        self.assertEqual(view, routable_page.archive_by_year)
-        self.assertEqual(args, ('2014',))
-        self.assertEqual(kwargs, {})
-        self.check_route_request(root_page, ['routing-en-03', 'routing-en-0301'], page_0301)
+            view, args, kwargs = routable_page.resolve_subpage('/archive/year/2014/')
+            self.assertEqual(view, routable_page.archive_by_year)
+            self.assertEqual(args, ('2014',))
+            self.assertEqual(kwargs, {})
+            self.check_route_request(root_page, ['routing-en-03', 'routing-en-0301'], page_0301)
 
+    @max_num_queries(83)
     def test_get_url_parts(self):
-        site_pages = {
-            'model': models.TestRootPage,
-            'kwargs': {'title': 'root URL parts', },
-            'children': {
-                'child1': {
-                    'model': models.TestSlugPage1,
-                    'kwargs': {'title': 'child1 URL parts', 'slug_de': 'url-parts-de-01', 'slug_en': 'url-parts-en-01'},
-                },
-                'child2': {
-                    'model': models.TestSlugPage1,
-                    'kwargs': {'title': 'child2 URL parts', 'slug': 'url-parts-de-02'},
-                },
+        site_pages = _root_page_node(
+            kwargs={'title': 'root URL parts', },
+            children={
+                'child1': _slug_page1_node(
+                    kwargs={'title': 'child1 URL parts', 'slug_de': 'url-parts-de-01', 'slug_en': 'url-parts-en-01'},
+                ),
+                'child2': _slug_page1_node(
+                    kwargs={'title': 'child2 URL parts', 'slug': 'url-parts-de-02'},
+                ),
             },
-        }
+        )
         site = page_factory.create_page_tree(site_pages)
 
         root_page = site_pages['instance']
-        page_01 = site_pages['children']['child1']['instance']
-        page_02 = site_pages['children']['child2']['instance']
+        page_01 = site_pages['flat']['child1']
+        page_02 = site_pages['flat']['child2']
 
         self.assertEqual(root_page.relative_url(site), '/de/')
         self.assertEqual(page_01.relative_url(site), '/de/url-parts-de-01/')
         self.assertEqual(page_02.relative_url(site), '/de/url-parts-de-02/')
 
-        translation.activate('en')
+        with translation.override('en'):
+            self.assertEqual(root_page.relative_url(site), '/en/')
+            self.assertEqual(page_01.relative_url(site), '/en/url-parts-en-01/')
+            self.assertEqual(page_02.relative_url(site), '/en/url-parts-de-02/')
 
-        self.assertEqual(root_page.relative_url(site), '/en/')
-        self.assertEqual(page_01.relative_url(site), '/en/url-parts-en-01/')
-        self.assertEqual(page_02.relative_url(site), '/en/url-parts-de-02/')
-
-    @override_settings(LANGUAGE_CODE='de')
+    @max_num_queries(83)
     def test_url(self):
-        site_pages = {
-            'model': models.TestRootPage,
-            'kwargs': {'title': 'root URL', },
-            'children': {
-                'child1': {
-                    'model': models.TestSlugPage1,
-                    'kwargs': {'title': 'child1 URL', 'slug_de': 'url-de-01', 'slug_en': 'url-en-01'},
-                },
-                'child2': {
-                    'model': models.TestSlugPage2,
-                    'kwargs': {'title': 'child2 URL', 'slug_de': 'url-de-02'},
-                },
+        site_pages = _root_page_node(
+            kwargs={'title': 'root URL', },
+            children={
+                'child1': _slug_page1_node(
+                    kwargs={'title': 'child1 URL', 'slug_de': 'url-de-01', 'slug_en': 'url-en-01'},
+                ),
+                'child2': _slug_page2_node(
+                    kwargs={'title': 'child2 URL', 'slug_de': 'url-de-02'},
+                ),
             },
-        }
+        )
         page_factory.create_page_tree(site_pages)
 
         root_page = site_pages['instance']
-        page_01 = site_pages['children']['child1']['instance']
-        page_02 = site_pages['children']['child2']['instance']
+        page_01 = site_pages['flat']['child1']
+        page_02 = site_pages['flat']['child2']
 
         self.assertEqual(root_page.url, '/de/')
-        self.assertEqual(page_01.url, '/de/url-de-01/')
-        self.assertEqual(page_02.url, '/de/url-de-02/')
-
-        translation.activate('en')
-
-        self.assertEqual(root_page.url, '/en/')
-        self.assertEqual(page_01.url, '/en/url-en-01/')
-        self.assertEqual(page_02.url, '/en/url-de-02/')
-
-    @override_settings(LANGUAGE_CODE='de')
+        # the site root paths are cached per language, further lookups don't hit the database
+        with self.assertNumQueries(0):
+            self.assertEqual(page_01.url, '/de/url-de-01/')
+            self.assertEqual(page_02.url, '/de/url-de-02/')
+
+        with translation.override('en'):
+            self.assertEqual(root_page.url, '/en/')
+            with self.assertNumQueries(0):
+                self.assertEqual(page_01.url, '/en/url-en-01/')
+                self.assertEqual(page_02.url, '/en/url-de-02/')
+
+    @max_num_queries(126)
     def test_root_page_slug(self):
-        site_pages = {
-            'model': models.TestRootPage,
-            'kwargs': {
+        site_pages = _root_page_node(
+            kwargs={
                 'title': 'root URL',
                 'slug_de': 'root-de',
                 'slug_en': 'root-en'
             },
-            'children': {
-                'child1': {
-                    'model': models.TestSlugPage1,
-                    'kwargs': {
+            children={
+                'child1': _slug_page1_node(
+                    kwargs={
                         'title': 'child1 URL',
                         'slug_de': 'url-de-01',
                         'slug_en': 'url-en-01'
                     },
-                },
-                'child2': {
-                    'model': models.TestSlugPage2,
-                    'kwargs': {
+                ),
+                'child2': _slug_page2_node(
+                    kwargs={
                         'title': 'child2 URL',
                         'slug_de': 'url-de-02'
                     },
-                },
-                'child3': {
-                    'model': models.TestSlugPage2,
-                    'kwargs': {
+                ),
+                'child3': _slug_page2_node(
+                    kwargs={
                         'title': 'child3 URL',
                         'slug_de': 'url-de-03'
                     },
-                },
+                ),
             },
-        }
+        )
         page_factory.create_page_tree(site_pages)
-        site = Site.objects.get(is_default_site=True)
-        request = HttpRequest()
-        request.META['HTTP_HOST'] = site.hostname
-        request.META['SERVER_PORT'] = site.port
 
         site_root_page = site_pages['instance']
-        wagtail_page_01 = site_pages['children']['child1']['instance']
-        wagtail_page_02 = site_pages['children']['child2']['instance']
-        wagtail_page_03 = site_pages['children']['child3']['instance']
-        self.assertEqual(wagtail_page_01.url, '/de/url-de-01/')
-        self.assertEqual(wagtail_page_01.url_path, '/root-de/url-de-01/')
-        self.assertEqual(wagtail_page_02.get_url(request=request), '/de/url-de-02/')  # with request
-
-        translation.activate('en')
-
-        self.assertEqual(wagtail_page_01.url, '/en/url-en-01/')
-        self.assertEqual(wagtail_page_01.url_path, '/root-en/url-en-01/')
-        self.assertEqual(wagtail_page_02.get_url(request=request), '/en/url-de-02/')
-
-        translation.activate('de')
-
-        # new request after changing language
-        self.assertEqual(wagtail_page_03.url, '/de/url-de-03/')
-        self.assertEqual(wagtail_page_01.get_url(request=request), '/de/url-de-01/')
-
-        # URL should not be broken after updating the root_page (ensure the cache is evicted)
-        self.assertEqual(wagtail_page_01.url, '/de/url-de-01/')
-        site_root_page.slug = 'new-root-de'
-        site_root_page.save()
-        wagtail_page_01_new = site_root_page.get_children().get(id=wagtail_page_01.id)
-        self.assertEqual(wagtail_page_01_new.url, '/de/url-de-01/')
-
-    def test_set_translation_url_paths_command(self):
-        """
-        Assert set_translation_url_paths management command works correctly
-        """
-        site_pages = {
-            'model': models.TestRootPage,
-            'kwargs': {'title': 'root untranslated', },
-            'children': {
-                'child': {
-                    'model': models.TestSlugPage1,
-                    'kwargs': {'title': 'child untranslated'},
-                    'children': {
-                        'grandchild1': {
-                            'model': models.TestSlugPage1,
-                            'kwargs': {'title': 'grandchild1 untranslated'},
-                            'children': {
-                                'grandgrandchild': {
-                                    'model': models.TestSlugPage1,
-                                    'kwargs': {'title': 'grandgrandchild untranslated'},
-                                },
-                            },
-                        },
-                        'grandchild2': {
-                            'model': models.TestSlugPage2,
-                            'kwargs': {'title': 'grandchild2 untranslated'},
-                        },
-                    },
-                },
-                'child2': {
-                    'model': models.TestSlugPage1,
-                    'kwargs': {'title': 'child2 translated', 'slug_en': 'child2-translated-en'},
-                    'children': {
-                        'grandchild1': {
-                            'model': models.TestSlugPage1,
-                            'kwargs': {'title': 'grandchild1 translated', 'slug_en': 'grandchild1-translated-en'},
-                            'children': {
-                                'grandgrandchild': {
-                                    'model': models.TestSlugPage1,
-                                    'kwargs': {'title': 'grandgrandchild1 translated',
-                                               'slug_en': 'grandgrandchild1-translated-en'},
-                                },
-                            },
-                        },
-                    },
-                },
-            },
-        }
-        page_factory.create_page_tree(site_pages)
-
-        # Revert grandchild1 and grandgrandchild url_path_en to their initial untranslated states
-        # to simulate pages that haven't been translated yet
-        models.TestSlugPage1.objects.filter(slug_de__in=['grandchild1-untranslated', 'grandgrandchild-untranslated']) \
-            .rewrite(False).update(slug_en=None, url_path_en=None)
-
-        # re-fetch to pick up latest from DB
-        grandchild1 = models.TestSlugPage1.objects.get(slug_de='grandchild1-untranslated')
-        self.assertEqual(grandchild1.url_path_en, None)
-        grandgrandchild = models.TestSlugPage1.objects.get(slug_de='grandgrandchild-untranslated')
-        self.assertEqual(grandgrandchild.url_path_en, None)
-
-        # change grandchild2 url_path to corrupt it in order to simulate Wagtail's 0.7 corruption bug:
-        # http://docs.wagtail.io/en/latest/releases/0.8.html#corrupted-url-paths-may-need-fixing
-        models.TestSlugPage2.objects.filter(
-            slug_de__in=['grandchild2-untranslated']
-        ).rewrite(False).update(url_path='corrupted', url_path_de='corrupted')
-
-        grandchild2 = models.TestSlugPage2.objects.get(slug_de='grandchild2-untranslated')
-        self.assertEqual(grandchild2.__dict__['url_path'], 'corrupted')
-
-        call_command('set_translation_url_paths', verbosity=0)
-
-        grandchild1 = models.TestSlugPage1.objects.get(slug_de='grandchild1-untranslated')
-        self.assertEqual(grandchild1.url_path_de, '/root-untranslated/child-untranslated/grandchild1-untranslated/')
-        self.assertEqual(grandchild1.url_path_en, '/root-untranslated/child-untranslated/grandchild1-untranslated/')
-        grandgrandchild = models.TestSlugPage1.objects.get(slug_de='grandgrandchild-untranslated')
-        self.assertEqual(grandgrandchild.url_path_de,
-                         '/root-untranslated/child-untranslated/grandchild1-untranslated/grandgrandchild-untranslated/')
-        self.assertEqual(grandgrandchild.url_path_en,
-                         '/root-untranslated/child-untranslated/grandchild1-untranslated/grandgrandchild-untranslated/')
-        grandchild2 = models.TestSlugPage2.objects.get(slug_de='grandchild2-untranslated')
+        wagtail_page_01 = site_pages['flat']['child1']
+        wagtail_page_02 = site_pages['flat']['child2']
+        wagtail_page_03 = site_pages['flat']['child3']
         self.assertEqual(
-            grandchild2.__dict__['url_path'],
-            '/root-untranslated/child-untranslated/grandchild2-untranslated/'
+            {
+                'url_01': wagtail_page_01.url,
+                'url_path_01': wagtail_page_01.url_path,
+                'url_02': wagtail_page_02.get_url(request=self.request),  # with request
+            },
+            {'url_01': '/de/url-de-01/', 'url_path_01': '/root-de/url-de-01/', 'url_02': '/de/url-de-02/'}
         )
-        self.assertEqual(grandchild2.url_path_de, '/root-untranslated/child-untranslated/grandchild2-untranslated/')
-        self.assertEqual(grandchild2.url_path_en, '/root-untranslated/child-untranslated/grandchild2-untranslated/')
 
-        grandgrandchild_translated = models.TestSlugPage1.objects.get(slug_de='grandgrandchild1-translated')
-        self.assertEqual(
-            grandgrandchild_translated.url_path_de,
-            '/root-untranslated/child2-translated/grandchild1-translated/grandgrandchild1-translated/'
-        )
-        self.assertEqual(
-            grandgrandchild_translated.url_path_en,
-            '/root-untranslated/child2-translated-en/grandchild1-translated-en/grandgrandchild1-translated-en/'
-        )
+        with translation.override('en'):
+            self.assertEqual(
+                {
+                    'url_01': wagtail_page_01.url,
+                    'url_path_01': wagtail_page_01.url_path,
+                    'url_02': wagtail_page_02.get_url(request=self.request),
+                },
+                {'url_01': '/en/url-en-01/', 'url_path_01': '/root-en/url-en-01/', 'url_02': '/en/url-de-02/'}
+            )
+
+        with translation.override('de'):
+            # new request after changing language
+            self.assertEqual(wagtail_page_03.url, '/de/url-de-03/')
+            self.assertEqual(wagtail_page_01.get_url(request=self.request), '/de/url-de-01/')
+
+            # URL should not be broken after updating the root_page (ensure the cache is evicted),
+            # the German site root paths were cached by the lookups above
+            self.assertIsNotNone(cache.get('wagtail_site_root_paths_de'))
+            site_root_page.slug = 'new-root-de'
+            site_root_page.save()
+            self.assertIsNone(cache.get('wagtail_site_root_paths_de'))
+            wagtail_page_01_new = site_root_page.get_children().get(id=wagtail_page_01.id)
+            self.assertEqual(wagtail_page_01_new.url, '/de/url-de-01/')
@@ -1,3 +1,8 @@
+from functools import lru_cache
+
+from wagtail.snippets.views.snippets import get_snippet_edit_handler
+
+
 class PageFactory(object):
 
     def __init__(self, initial_path=0):
@@ -8,6 +13,12 @@ class PageFactory(object):
         self.root_path += 1
         return self.root_path
 
+    def get_root_path(self):
+        """
+        Returns a path for a new root page that no other root page from the factory uses
+        """
+        return "%04d" % (self.path,)
+
     def create_page_tree(self, nodes=None):
         """
         Creates a page tree with a dict of page nodes following the below structure:
@@ -25,48 +36,92 @@ class PageFactory(object):
             },
         },
 
+        Every node gets its page set as 'instance', and the root node also gets a 'flat' dict
+        of all the pages by their dotted key (see ``walk``), e.g. ``nodes['flat']['child']``.
+
         :param nodes: representing a page tree
         :return: site
         """
         if not nodes:
             return None
 
+        self.create_instance(nodes, self.create_top_root(), 1)
+        site = self.set_site_root(nodes['instance'])
+
+        nodes['flat'] = {key: node['instance'] for key, node in self.walk(nodes)}
+        return site
+
+    def create_page_tree_flat(self, rows):
+        """
+        Creates a page tree from a flat list of ``(key, model, kwargs)`` rows, where the key is the
+        dotted path of the page below the site root:
+         [
+            ('', Page, {'title': 'root'}),
+            ('child', Page, {'title': 'child'}),
+            ('child.grandchild', Page, {'title': 'grandchild'}),
+         ]
+
+        The '' row is the site root and a page's row must come after the row of its parent.
+
+        :param rows: representing a page tree
+        :return: site and a dict of the created pages by key
+        """
+        top_root = self.create_top_root()
+
+        pages = {}
+        for key, model, kwargs in rows:
+            parent = pages[key.rpartition('.')[0]] if key else top_root
+            pages[key] = parent.add_child(instance=model(**kwargs))
+
+        return self.set_site_root(pages['']), pages
+
+    def create_top_root(self):
+        """
+        Creates the top root page the site root of a tree goes under, to mimic Wagtail's real behaviour
+        """
         from .models import TestRootPage
-        from wagtail.core.models import Site
 
-        # add a top root node to mimic Wagtail's real behaviour
-        all_nodes = {
-            'model': TestRootPage,
-            'kwargs': {'title_de': 'Root', 'slug_de': 'root', },
-            'children': {
-                'site_root': nodes,
-            },
-        }
-        self.create_instance(all_nodes)
+        return TestRootPage.objects.create(title_de='Root', slug_de='root', path=self.get_root_path(), depth=1)
+
+    def set_site_root(self, page):
+        """
+        Points the default site at the given page, reusing the site if the test class already created one
+        """
+        from wagtail.core.models import Site
 
-        site_root_node = nodes['instance']
-        site = Site.objects.create(root_page=site_root_node, hostname='localhost', port=80, is_default_site=True)
+        site, _ = Site.objects.update_or_create(
+            hostname='localhost', port=80, defaults={'root_page': page, 'is_default_site': True})
         return site
 
+    @classmethod
+    def walk(cls, node, key=''):
+        """
+        Yields every node of the tree along with its dotted key, e.g. 'child.grandchild'.
+        The root node key is ''.
+        """
+        yield key, node
+        for name, child in node.get('children', {}).items():
+            yield from cls.walk(child, '{}.{}'.format(key, name) if key else name)
+
     def create_instance(self, node, parent=None, order=None):
         if parent:
             path = "{}{}".format(parent.path, "%04d" % (order,))
             depth = parent.depth + 1
         else:
-            path = "%04d" % (self.path,)
+            path = self.get_root_path()
             depth = 1
 
         args = node.get('args', [])
-        kwargs = node.get('kwargs', {})
+        # copy the kwargs so the spec is left untouched
+        kwargs = dict(node.get('kwargs', {}))
         kwargs['path'] = kwargs.get('path', path)
         kwargs['depth'] = kwargs.get('depth', depth)
         if parent:
+            # add_child already saves the instance
             node_page = parent.add_child(instance=node['model'](*args, **kwargs))
-            node_page.save()
         else:
             node_page = node['model'].objects.create(*args, **kwargs)
 
-        node_page.save_revision().publish()
         node['instance'] = node_page
 
         for n, child in enumerate(node.get('children', {}).values()):
@@ -76,3 +131,19 @@ class PageFactory(object):
 
 
 page_factory = PageFactory()
+
+
+@lru_cache(maxsize=None)
+def get_snippet_form_class(model):
+    """
+    Builds the edit form class of a snippet model only once per test run
+    """
+    return get_snippet_edit_handler(model).get_form_class()
+
+
+@lru_cache(maxsize=None)
+def get_page_form_class(model):
+    """
+    Builds the edit form class of a page model only once per test run
+    """
+    return model.get_edit_handler().get_form_class()